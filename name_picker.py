@@ -5,10 +5,16 @@
 # @Verison  : V1.0
 # @Desctrion:
 
-import sys, os, random, json
+import sys, os, random, json, time
+from collections import OrderedDict, deque
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, QEvent
+from PySide6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QTimer, QEvent,
+    QObject, Signal, QRunnable, QThreadPool, QThread
+)
+from PySide6.QtGui import QImage, QImageReader, QPixmap, QColor
 
 
 from qfluentwidgets import (
@@ -20,18 +26,34 @@ from qfluentwidgets import (
     LineEdit, TableWidget,
     BodyLabel, StrongBodyLabel,
     Slider, SpinBox, CheckBox,
-    ProgressBar, MessageBox, CardWidget,
+    ProgressBar, MessageBox, MessageBoxBase, CardWidget, PlainTextEdit, ComboBox,
+    SubtitleLabel,
     InfoBadge, InfoBadgePosition
 )
 from PySide6.QtWidgets import (
     QApplication, QFileDialog, QTableWidgetItem, QAbstractItemView,
-    QWidget, QVBoxLayout, QHBoxLayout, QFrame, QSizePolicy
+    QWidget, QVBoxLayout, QHBoxLayout, QFrame, QSizePolicy, QLabel
 )
 
+from roster_sync import SyncLog, make_peer, roster_room, prune_logs, new_node_id, claim_node, ALL
+
 
 CACHE_FILE = "roster_cache.xlsx"
 STATE_FILE = "app_state.json"
 
+PHOTO_DIR = "photos"            # 默认照片目录，文件名为学号，如 2023001.jpg
+PHOTO_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+PHOTO_SIZE = 160                # 大屏照片边长（像素）
+PHOTO_CACHE_MB = 64             # 缩略图缓存上限
+PHOTO_PREFETCH = 8              # 滚动时提前抽好并预解码的人数
+
+TIMETABLE_LEAD = 120            # 上课前多少秒开始在后台预读下一节课的名单
+TIMETABLE_ASK_AGAIN = 60        # 老师选“稍后”后，隔多少秒再问一次
+
+SYNC_LOG_DIR = "sync_logs"      # 本机的同步日志，按（名单, 日期, 节点）一个文件
+SYNC_MODES = ["off", "lan", "folder"]
+SYNC_LABELS = ["不同步", "局域网同步", "共享文件夹同步"]
+
 COLUMN_ALIASES = {
     "学号": {"学号", "学员编号", "学生编号", "学籍号", "student_id", "id"},
     "姓名": {"姓名", "学生姓名", "name", "student_name"}
@@ -50,6 +72,55 @@ def resolve_columns(df: pd.DataFrame):
     return cols_map
 
 
+def split_groups(idx, n_groups, prev=None, rng=None):
+    """把 idx 一次性随机打乱后均分成 n_groups 组（各组人数最多差 1）。
+    prev 与 idx 等长，是每人上次的组号（-1 表示没有）：上次同组的人排在一起后轮流发到各组，
+    只要上次那组人数不超过 n_groups，就不会再分到同一组。"""
+    rng = rng or np.random.default_rng()
+    idx = np.asarray(idx)
+    if len(idx) == 0: return []
+    n_groups = max(1, min(n_groups, len(idx)))
+    order = rng.permutation(len(idx))
+    if prev is not None:
+        prev = np.asarray(prev, dtype=int)
+        # 给上次的组随机排个先后，再按组做稳定排序（组内仍保持随机顺序）
+        rank = rng.permutation(prev.max() + 2)[prev + 1]
+        order = order[np.argsort(rank[order], kind="stable")]
+    labels = (np.arange(len(idx)) + rng.integers(n_groups)) % n_groups
+    return [idx[order[labels == g]] for g in range(n_groups)]
+
+
+def search_keys(df: pd.DataFrame):
+    """搜索索引：每行“学号 + 换行 + 姓名”，搜索时一次向量化匹配，不再逐行读表格"""
+    return (df["学号"].astype(str) + "\n" + df["姓名"].astype(str)).reset_index(drop=True)
+
+
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+_WEEKDAY_ALIASES = {**{w: i for i, w in enumerate(WEEKDAYS)},
+                    **{"星期" + w[1]: i for i, w in enumerate(WEEKDAYS)},
+                    "周天": 6, "星期天": 6}
+
+
+def parse_timetable(text: str):
+    """每行“周X HH:MM 花名册路径”，返回按时间排序的 [(星期 0-6, 时间, 路径)] 和错误说明列表"""
+    entries, errors, seen = [], [], {}
+    for no, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line: continue
+        parts = line.split(maxsplit=2)
+        try:
+            wd = _WEEKDAY_ALIASES[parts[0]]
+            hm = datetime.strptime(parts[1], "%H:%M").strftime("%H:%M")
+            path = parts[2].strip()
+        except (KeyError, ValueError, IndexError):
+            errors.append(f"第 {no} 行格式不对：{line}"); continue
+        if (wd, hm) in seen:
+            errors.append(f"第 {no} 行与第 {seen[wd, hm]} 行都是 {WEEKDAYS[wd]} {hm}"); continue
+        seen[wd, hm] = no
+        entries.append((wd, hm, path))
+    return sorted(entries), errors
+
+
 class PandasModel(QAbstractTableModel):
     def __init__(self, df: pd.DataFrame):
         super().__init__()
@@ -89,7 +160,157 @@ class PandasModel(QAbstractTableModel):
     def df(self): return self._df
 
 
+class TimetableDialog(MessageBoxBase):
+    """课表编辑：每行一节课，到点自动切换到对应的花名册"""
+    def __init__(self, text, parent=None):
+        super().__init__(parent)
+        self.titleLabel = SubtitleLabel("课表", self)
+        self.tipLabel = BodyLabel("每行：星期 上课时间 花名册路径，如 周一 08:00 D:/名单/一班.xlsx", self)
+        self.editor = PlainTextEdit(self)
+        self.editor.setPlainText(text)
+        self.editor.setMinimumSize(560, 220)
+        self.btnAdd = PushButton(FI.ADD, "添加花名册…", self)
+        self.btnAdd.clicked.connect(self._add_file)
+
+        self.viewLayout.addWidget(self.titleLabel)
+        self.viewLayout.addWidget(self.tipLabel)
+        self.viewLayout.addWidget(self.editor)
+        self.viewLayout.addWidget(self.btnAdd, 0, Qt.AlignLeft)
+        self.yesButton.setText("保存")
+        self.cancelButton.setText("取消")
+
+    def _add_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        if path:
+            now = datetime.now()
+            self.editor.appendPlainText(f"{WEEKDAYS[now.weekday()]} {now.strftime('%H:%M')}  {path}")
+
+    def validate(self):
+        # 有错误（格式不对、同一时段重复）时不关闭对话框，把第一条错误显示出来
+        _, errors = parse_timetable(self.text())
+        if errors:
+            self.tipLabel.setText(errors[0])
+            self.tipLabel.setTextColor(QColor("#c42b1c"), QColor("#ff99a4"))
+        return not errors
+
+    def text(self): return self.editor.toPlainText()
+
+
+class _RosterJob(QRunnable):
+    """后台线程：读取并整理下一节课的花名册，连同搜索索引、抽取池和名单缓存一起准备好"""
+    def __init__(self, owner, key, path, cache_path):
+        super().__init__()
+        self.setAutoDelete(True)
+        self._owner, self._key, self._path, self._cache_path = owner, key, path, cache_path
+
+    def run(self):
+        try:
+            raw = pd.read_excel(self._path, engine="openpyxl" if self._path.endswith("xlsx") else None)
+            cols = resolve_columns(raw) if not raw.empty else None
+            if not cols: raise ValueError("需要包含“学号”和“姓名”列或其同义列。")
+            df = self._owner._prepare_roster(raw, cols)
+            pool = list(range(len(df)))
+            random.shuffle(pool)
+            # 名单缓存先写到临时文件，到点只需改名替换，不在界面线程里跑 to_excel
+            self._owner._write_cache(df, self._cache_path)
+            self._owner.rosterReady.emit(self._key, (df, search_keys(df), pool))
+        except Exception as e:
+            self._owner.rosterFailed.emit(self._key, f"{os.path.basename(self._path)}：{e}")
+
+
+class _PhotoJob(QRunnable):
+    """后台线程里解码并缩小一张照片（只用 QImage，QPixmap 不能跨线程）"""
+    def __init__(self, cache, gen, sid, path, size):
+        super().__init__()
+        self.setAutoDelete(True)
+        self._cache, self._gen, self._sid, self._path, self._size = cache, gen, sid, path, size
+
+    def run(self):
+        reader = QImageReader(self._path)
+        reader.setAutoTransform(True)
+        src = reader.size()
+        if src.isValid() and (src.width() > self._size or src.height() > self._size):
+            # 解码时直接缩放，JPEG 可以跳过大部分像素，比先全尺寸解码再缩小快得多
+            reader.setScaledSize(src.scaled(self._size, self._size, Qt.KeepAspectRatio))
+        self._cache._decoded.emit(self._gen, self._sid, reader.read())
+
+
+class PhotoCache(QObject):
+    """学号 -> 缩略图。解码放在线程池，主线程只查 LRU 缓存，滚动时不会被卡住"""
+    photoReady = Signal(str)
+    _decoded = Signal(int, str, QImage)
+
+    def __init__(self, parent=None, size=PHOTO_SIZE, cap_mb=PHOTO_CACHE_MB):
+        super().__init__(parent)
+        self._size = size
+        self._cap = cap_mb * 1024 * 1024
+        self._bytes = 0
+        self._lru = OrderedDict()   # 学号 -> QPixmap，最近使用的在末尾
+        self._paths = {}            # 学号 -> 照片路径
+        self._pending = {}          # 学号 -> 已排队任务的最高优先级
+        self._gen = 0               # 换目录后丢弃旧任务的结果
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, min(4, QThread.idealThreadCount() - 1)))
+        self._decoded.connect(self._on_decoded)
+
+    def set_dir(self, folder):
+        """扫描照片目录并清空缓存，返回找到的照片数"""
+        self._gen += 1
+        self._pool.clear()
+        self._lru.clear(); self._bytes = 0
+        self._pending.clear()
+        self._paths = {}
+        if not folder or not os.path.isdir(folder): return 0
+        for fn in os.listdir(folder):
+            stem, ext = os.path.splitext(fn)
+            if ext.lower() in PHOTO_EXTS:
+                self._paths.setdefault(stem.strip(), os.path.join(folder, fn))
+        return len(self._paths)
+
+    def count(self): return len(self._paths)
+
+    def get(self, sid):
+        """命中返回 QPixmap；未命中返回 None 并排队解码，解码完成后发 photoReady"""
+        pm = self._lru.get(sid)
+        if pm is not None:
+            self._lru.move_to_end(sid)
+            return pm
+        self.prefetch([sid], priority=2)
+        return None
+
+    def prefetch(self, sids, priority=0):
+        """排队解码；priority 越高越先解码，马上要显示的照片不会排在预热任务后面"""
+        for sid in sids:
+            # 已排队但优先级更低时再排一个更高优先级的任务，先完成的那个生效
+            if sid in self._lru or self._pending.get(sid, -1) >= priority: continue
+            path = self._paths.get(sid)
+            if path is None: continue
+            self._pending[sid] = priority
+            self._pool.start(_PhotoJob(self, self._gen, sid, path, self._size), priority)
+
+    def _on_decoded(self, gen, sid, img):
+        if gen != self._gen or sid in self._lru: return
+        self._pending.pop(sid, None)
+        if img.isNull():
+            self._paths.pop(sid, None)   # 坏图不再重试
+            return
+        pm = QPixmap.fromImage(img)
+        self._lru[sid] = pm
+        self._bytes += self._cost(pm)
+        while self._bytes > self._cap and len(self._lru) > 1:
+            _, old = self._lru.popitem(last=False)
+            self._bytes -= self._cost(old)
+        self.photoReady.emit(sid)
+
+    @staticmethod
+    def _cost(pm):
+        return pm.width() * pm.height() * max(pm.depth(), 8) // 8
+
+
 class MainWindow(FluentWindow):
+    rosterReady = Signal(object, object)    # (课表版本, 课次) -> (df, 搜索索引, 抽取池)
+    rosterFailed = Signal(object, str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("课堂点名 · 章老师版")
@@ -103,6 +324,33 @@ class MainWindow(FluentWindow):
         self.last_show_text = ""
         self.no_repeat = True
         self.current_idx_pool = []
+        self.photo_dir = PHOTO_DIR
+        self._upcoming = deque()     # 滚动时提前抽好的下几帧
+        self._shown_sid = None
+        self.last_groups = []        # [(组名, 行号数组)]，最近一次多人抽取/分组的结果
+        self._picked = set()         # 不重复模式下本轮多人抽取已抽过的行，换名单/清空签到/抽完一轮时重置
+        self._prev_group = {}        # 学号 -> 上次分组的组号
+        self.rng = np.random.default_rng()
+        self.sync_mode = "off"
+        self.sync_folder = ""
+        self._saved_node = ""        # 本机固定的同步节点号，保存在 app_state.json
+        self.sync_node = ""          # 本进程实际使用的节点号（同目录另开一个程序时会不同）
+        self.sync_log = None
+        self.sync_peer = None
+        self._sync_room = ""
+        self._row_of = {}            # 学号 -> 行号
+        self._search_keys = pd.Series(dtype=object)
+        self._hidden = np.zeros(0, dtype=bool)
+        self.timetable = []          # [(星期 0-6, HH:MM, 花名册路径)]
+        self._tt_jobs = {}           # 课次 (日期, 时间, 路径) -> 预读结果，None 表示还在读
+        self._tt_done = set()        # 今天已切换/已放弃的课次
+        self._tt_gen = 0             # 课表每次保存加一，旧版本的预读结果直接丢弃
+        self._tt_asked = {}          # 课次 -> 上次询问是否切换的时间
+        self._tt_asking = False
+
+        # 照片
+        self.photos = PhotoCache(self)
+        self.photos.photoReady.connect(self._on_photo_ready)
 
         # 定时器
         self.roll_timer = QTimer(self)
@@ -113,12 +361,25 @@ class MainWindow(FluentWindow):
         self.auto_sign_timer.setSingleShot(True)
         self.auto_sign_timer.timeout.connect(self.sign_current_or_selected)
 
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setInterval(200)    # 多机同步轮询间隔（毫秒）
+        self.sync_timer.timeout.connect(self._sync_poll)
+
+        self.timetable_timer = QTimer(self)
+        self.timetable_timer.setInterval(1000)
+        self.timetable_timer.timeout.connect(self._timetable_tick)
+        self.rosterReady.connect(self._on_roster_ready)
+        self.rosterFailed.connect(self._on_roster_failed)
+
         self._load_state()
         self._build_ui()
+        self._apply_photo_dir()
         self._autoload_cache()
+        self.timetable_timer.start()
 
     # --------- 工具函数 ----------
-    def _ensure_text(self, df):
+    @staticmethod
+    def _ensure_text(df):
         """把关键列都当作文本列，并把 NaN 变为空串"""
         for c in ["学号", "姓名", "签到状态", "签到时间"]:
             if c in df.columns:
@@ -189,6 +450,7 @@ class MainWindow(FluentWindow):
         self.btnClearSel = PushButton(FI.REMOVE, "清除选中行签到", page)
         self.chkNoRepeat = CheckBox("不重复抽取（默认）", page)
         self.btnTheme = PushButton(FI.BRUSH, "切换主题", page)
+        self.btnPhotos = PushButton(FI.PHOTO, "照片目录", page)
         self.searchBox = LineEdit(page);
         self.searchBox.setPlaceholderText("按学号/姓名搜索")
 
@@ -200,13 +462,14 @@ class MainWindow(FluentWindow):
         self.chkNoRepeat.setChecked(self.no_repeat)
         self.chkNoRepeat.stateChanged.connect(self._toggle_no_repeat)
         self.btnTheme.clicked.connect(self._toggle_theme)
+        self.btnPhotos.clicked.connect(self.choose_photo_dir)
         self.searchBox.textChanged.connect(self._on_search)
 
         topBar = QHBoxLayout()
         topBar.setContentsMargins(0, 0, 0, 0)
         topBar.setSpacing(8)
         for w in [self.btnImport, self.btnToggle, self.btnSign, self.btnClearAll, self.btnClearSel,
-                  self.chkNoRepeat, self.btnTheme, self.searchBox]:
+                  self.chkNoRepeat, self.btnTheme, self.btnPhotos, self.searchBox]:
             topBar.addWidget(w)
         topBar.addStretch(1)
 
@@ -216,11 +479,24 @@ class MainWindow(FluentWindow):
         bigFrame = QFrame(page)
         bigFrame.setFrameShape(QFrame.StyledPanel)
         bigFrame.setStyleSheet("QFrame{background:rgba(0,0,0,0.05); border-radius:18px;}")
-        bigLay = QVBoxLayout(bigFrame);
+        bigLay = QHBoxLayout(bigFrame);
         bigLay.setContentsMargins(16, 16, 16, 16)
         self.bigText.setStyleSheet("QLabel{font-size:48px; font-weight:800;}")
         self.bigText.setMinimumHeight(120)
-        bigLay.addWidget(self.bigText)
+        self.photoLabel = QLabel(bigFrame)
+        self.photoLabel.setFixedSize(PHOTO_SIZE, PHOTO_SIZE)
+        self.photoLabel.setAlignment(Qt.AlignCenter)
+        self.photoLabel.setStyleSheet("QLabel{background:transparent;}")
+        self.photoLabel.hide()       # 没有照片目录时不占位
+        self.groupView = PlainTextEdit(bigFrame)
+        self.groupView.setReadOnly(True)
+        self.groupView.setMinimumHeight(120)
+        self.groupView.setMaximumHeight(260)
+        setFont(self.groupView, 20)
+        self.groupView.hide()        # 多人抽取/分组时才替换大字显示
+        bigLay.addWidget(self.photoLabel)
+        bigLay.addWidget(self.bigText, stretch=1)
+        bigLay.addWidget(self.groupView, stretch=1)
 
         # ===== 统计 & 控件 =====
         self.lblStats = StrongBodyLabel("总数：0 | 已签到：0 | 未签到：0", page)
@@ -248,29 +524,73 @@ class MainWindow(FluentWindow):
         ctrlLay.addWidget(BodyLabel("自动签到延迟（秒）", page))
         ctrlLay.addWidget(self.countdownSpin)
 
+        # ===== 多人抽取 / 分组 =====
+        self.pickSpin = SpinBox(page)
+        self.pickSpin.setRange(1, 100)
+        self.pickSpin.setValue(5)
+        self.btnPickMany = PushButton(FI.PEOPLE, "抽取多人", page)
+        self.groupSpin = SpinBox(page)
+        self.groupSpin.setRange(2, 50)
+        self.groupSpin.setValue(4)
+        self.btnGroup = PushButton(FI.TILES, "随机分组", page)
+        self.chkAvoidPrev = CheckBox("避开上次同组", page)
+        self.btnExportGroups = PushButton(FI.SAVE, "导出分组", page)
+
+        self.btnPickMany.clicked.connect(self.pick_many)
+        self.btnGroup.clicked.connect(self.make_groups)
+        self.btnExportGroups.clicked.connect(self.export_groups)
+
+        self.syncBox = ComboBox(page)
+        self.syncBox.addItems(SYNC_LABELS)
+        self.syncBox.setCurrentIndex(SYNC_MODES.index(self.sync_mode))
+        self.syncBox.currentIndexChanged.connect(self._on_sync_mode)
+        self.btnTimetable = PushButton(FI.CALENDAR, "课表", page)
+        self.btnTimetable.clicked.connect(self.edit_timetable)
+
+        groupLay = QHBoxLayout()
+        groupLay.setSpacing(12)
+        groupLay.addWidget(BodyLabel("人数", page))
+        groupLay.addWidget(self.pickSpin)
+        groupLay.addWidget(self.btnPickMany)
+        groupLay.addWidget(BodyLabel("组数", page))
+        groupLay.addWidget(self.groupSpin)
+        groupLay.addWidget(self.btnGroup)
+        groupLay.addWidget(self.chkAvoidPrev)
+        groupLay.addWidget(self.btnExportGroups)
+        groupLay.addStretch(1)
+        groupLay.addWidget(BodyLabel("多机签到", page))
+        groupLay.addWidget(self.syncBox)
+        groupLay.addWidget(self.btnTimetable)
+
         # ===== 表格 =====
-        self.table = TableWidget(page)  # 1.x 只接受 parent
-        self.table.setRowCount(0)
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["学号", "姓名", "签到状态", "签到时间"])
-        self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
-        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.table = self._make_table(page)
 
         # ===== 页面总体布局 =====
         root = QVBoxLayout(page)
+        self._pageRoot = root
         root.setContentsMargins(20, 16, 20, 16)
         root.setSpacing(12)
         root.addLayout(topBar)
         root.addWidget(bigFrame)
         root.addLayout(ctrlLay)
+        root.addLayout(groupLay)
         root.addWidget(self.table, stretch=1)
 
         return page
 
+    def _make_table(self, parent):
+        table = TableWidget(parent)  # 1.x 只接受 parent
+        table.setRowCount(0)
+        table.setColumnCount(4)
+        table.setHorizontalHeaderLabels(["学号", "姓名", "签到状态", "签到时间"])
+        table.setAlternatingRowColors(True)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setSelectionMode(QAbstractItemView.SingleSelection)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        return table
+
 
     # --------- 数据/缓存 ----------
     def _toggle_theme(self):
@@ -287,28 +607,83 @@ class MainWindow(FluentWindow):
 
     def _save_state(self):
         try:
-            json.dump({"no_repeat": self.no_repeat}, open(STATE_FILE, "w", encoding="utf-8"))
+            json.dump({"no_repeat": self.no_repeat, "photo_dir": self.photo_dir,
+                       "sync_mode": self.sync_mode, "sync_folder": self.sync_folder,
+                       "sync_node": self._saved_node,
+                       "timetable": [{"weekday": wd, "time": hm, "file": f} for wd, hm, f in self.timetable]},
+                      open(STATE_FILE, "w", encoding="utf-8"), ensure_ascii=False)
         except Exception:
             pass
 
     def _load_state(self):
         if os.path.exists(STATE_FILE):
             try:
-                self.no_repeat = bool(json.load(open(STATE_FILE, "r", encoding="utf-8")).get("no_repeat", True))
+                state = json.load(open(STATE_FILE, "r", encoding="utf-8"))
+                self.no_repeat = bool(state.get("no_repeat", True))
+                self.photo_dir = state.get("photo_dir") or PHOTO_DIR
+                self.sync_mode = state.get("sync_mode") if state.get("sync_mode") in SYNC_MODES else "off"
+                self.sync_folder = state.get("sync_folder") or ""
+                self._saved_node = state.get("sync_node") or ""
+                self.timetable = sorted((t["weekday"], t["time"], t["file"])
+                                        for t in state.get("timetable", []) if "weekday" in t)
             except Exception:
                 self.no_repeat = True
+                self.photo_dir = PHOTO_DIR
+                self.sync_mode, self.sync_folder = "off", ""
+        if not self._saved_node:
+            self._saved_node = new_node_id()
+            self._save_state()
+        self.sync_node = claim_node(SYNC_LOG_DIR, self._saved_node)
+
+    # --------- 照片 ----------
+    def choose_photo_dir(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择照片目录", self.photo_dir or "")
+        if not folder: return
+        self.photo_dir = folder
+        n = self._apply_photo_dir()
+        self._save_state()
+        if n: self._toast("照片目录", f"找到 {n} 张照片。", "success")
+        else: self._toast("照片目录", "没有找到照片：文件名需为学号，如 2023001.jpg。", "warning")
+
+    def _apply_photo_dir(self):
+        n = self.photos.set_dir(self.photo_dir)
+        self.photoLabel.setVisible(n > 0)
+        self.photoLabel.clear()
+        self._shown_sid = None
+        return n
+
+    def _on_photo_ready(self, sid):
+        # 未命中时先空着，解码完成后如果还在显示这个人就补上
+        if sid == self._shown_sid:
+            pm = self.photos.get(sid)
+            if pm is not None: self.photoLabel.setPixmap(pm)
+
+    def _show_student(self, idx):
+        sid = self.df.at[idx, "学号"]
+        name = self.df.at[idx, "姓名"]
+        self.last_show_text = f"{sid}  {name}"
+        self.bigText.setText(self.last_show_text)
+        if not self.photoLabel.isHidden():
+            self._shown_sid = sid
+            pm = self.photos.get(sid)
+            if pm is None: self.photoLabel.clear()
+            else: self.photoLabel.setPixmap(pm)
 
     def _save_cache(self):
         """只缓存学号/姓名，保证下次打开签到列是空的"""
         if self.df.empty: return
         try:
-            roster = self.df[["学号", "姓名"]].copy()
-            roster["学号"] = roster["学号"].astype(str).str.strip()
-            roster["姓名"] = roster["姓名"].astype(str).str.strip()
-            roster.to_excel(CACHE_FILE, index=False)
+            self._write_cache(self.df, CACHE_FILE)
         except Exception:
             pass
 
+    @staticmethod
+    def _write_cache(df, path):
+        roster = df[["学号", "姓名"]].copy()
+        roster["学号"] = roster["学号"].astype(str).str.strip()
+        roster["姓名"] = roster["姓名"].astype(str).str.strip()
+        roster.to_excel(path, index=False)
+
     def _autoload_cache(self):
         """命中缓存：载入学号/姓名，签到列重置为空"""
         if not os.path.exists(CACHE_FILE): return
@@ -341,28 +716,54 @@ class MainWindow(FluentWindow):
         if not cols:
             self._toast("缺少列", "需要包含“学号”和“姓名”列或其同义列。", "error"); return
 
+        self._use_df(self._prepare_roster(df, cols))
+        self._rebuild_pool()
+        self._save_cache()
+        self._toast("导入成功", f"已载入 {len(self.df)} 名学生。", "success")
+
+    @staticmethod
+    def _prepare_roster(df, cols):
+        """统一列名、去空行、签到列置空（不碰界面，课表预读时在后台线程调用）"""
         df = df.rename(columns={cols["学号"]: "学号", cols["姓名"]: "姓名"})
         df = df.dropna(how="all").copy()
         df["学号"] = df["学号"].astype(str).str.strip()
         df["姓名"] = df["姓名"].astype(str).str.strip()
         df["签到状态"] = ""
         df["签到时间"] = ""
-        df = self._ensure_text(df)
+        return MainWindow._ensure_text(df).reset_index(drop=True)
 
-        self._use_df(df.reset_index(drop=True))
-        self._rebuild_pool()
-        self._save_cache()
-        self._toast("导入成功", f"已载入 {len(self.df)} 名学生。", "success")
-
-    def _use_df(self, df: pd.DataFrame):
+    def _use_df(self, df: pd.DataFrame, keys=None, table=None, hidden=None):
+        """table 为课表预读时提前建好的表格，直接换上，不再逐行重建；hidden 是它已设好的隐藏行"""
         self.df = df
         self.model = PandasModel(self.df)
+        self.last_groups = []
+        self._picked = set()
+        self._row_of = {sid: r for r, sid in enumerate(df["学号"])}
+        self._search_keys = keys if keys is not None else search_keys(df)
 
+        if table is None:
+            self._fill_table(self.table, df)
+        else:
+            self._pageRoot.replaceWidget(self.table, table)
+            self.table.deleteLater()
+            self.table = table
+            self.table.show()
+
+        if hidden is not None:
+            self._hidden = hidden    # 预建表格已按当时的搜索词隐藏好，这里只改之后有变化的行
+            self._on_search(self.searchBox.text())
+        else:
+            self._on_search(self.searchBox.text(), refresh_all=True)
+        self._update_stats()
+        self._restart_sync()
+
+    @staticmethod
+    def _fill_table(table, df):
         # 重建 TableWidget 内容
-        self.table.clearContents()
-        self.table.setRowCount(len(df))
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["学号", "姓名", "签到状态", "签到时间"])
+        table.clearContents()
+        table.setRowCount(len(df))
+        table.setColumnCount(4)
+        table.setHorizontalHeaderLabels(["学号", "姓名", "签到状态", "签到时间"])
 
         for r in range(len(df)):
             for c, col_name in enumerate(["学号", "姓名", "签到状态", "签到时间"]):
@@ -372,29 +773,33 @@ class MainWindow(FluentWindow):
                     item.setTextAlignment(Qt.AlignCenter)
                 else:
                     item.setTextAlignment(Qt.AlignVCenter)
-                self.table.setItem(r, c, item)
+                table.setItem(r, c, item)
 
         # 列宽设置
         idx = {"学号":0, "姓名":1, "签到状态":2, "签到时间":3}
         try:
-            self.table.setColumnWidth(idx["学号"], 120)
-            self.table.setColumnWidth(idx["姓名"], 180)
-            self.table.setColumnWidth(idx["签到状态"], 120)
-            self.table.setColumnWidth(idx["签到时间"], 180)
+            table.setColumnWidth(idx["学号"], 120)
+            table.setColumnWidth(idx["姓名"], 180)
+            table.setColumnWidth(idx["签到状态"], 120)
+            table.setColumnWidth(idx["签到时间"], 180)
         except Exception:
             pass
 
-        self._update_stats()
-
     # --------- 抽取/签到 ----------
     def _rebuild_pool(self):
         if self.df is None or self.df.empty:
             self.current_idx_pool = []; return
         if self.no_repeat:
-            self.current_idx_pool = self.df.index[self.df["签到状态"] != "已签到"].tolist()
+            unsigned = self.df.index[self.df["签到状态"] != "已签到"].tolist()
+            self.current_idx_pool = [i for i in unsigned if i not in self._picked]
+            if not self.current_idx_pool and unsigned:
+                # 没签到的人都被多人抽取抽过了：开始新一轮
+                self._picked.clear()
+                self.current_idx_pool = unsigned
         else:
             self.current_idx_pool = list(range(len(self.df)))
         random.shuffle(self.current_idx_pool)
+        self._upcoming.clear()
 
     def toggle_roll(self):
         if self.df is None or self.df.empty:
@@ -403,6 +808,8 @@ class MainWindow(FluentWindow):
             if self.no_repeat and (self.df["签到状态"] != "已签到").sum() == 0:
                 self._toast("完成", "全部学生已签到。", "success"); return
             if not self.current_idx_pool: self._rebuild_pool()
+            self._fill_upcoming()    # 第一帧之前就把前几帧的人选抽好，照片开始解码
+            self._set_group_view(False)
             self.rolling = True
             self.roll_timer.start()
             self.btnToggle.setText("暂停")
@@ -421,11 +828,19 @@ class MainWindow(FluentWindow):
             self._rebuild_pool()
             if not self.current_idx_pool:
                 self.toggle_roll(); return
-        idx = random.choice(self.current_idx_pool)
-        name = self.df.at[idx, "姓名"]
-        sid = self.df.at[idx, "学号"]
-        self.last_show_text = f"{sid}  {name}"
-        self.bigText.setText(self.last_show_text)
+        self._show_student(self._next_roll_idx())
+
+    def _next_roll_idx(self):
+        """提前抽好后面几帧的人选，让他们的照片在显示之前就已在后台解码"""
+        self._fill_upcoming()
+        idx = self._upcoming.popleft()
+        self._fill_upcoming()
+        return idx
+
+    def _fill_upcoming(self):
+        while len(self._upcoming) < PHOTO_PREFETCH:
+            self._upcoming.append(random.choice(self.current_idx_pool))
+        self.photos.prefetch((self.df.at[i, "学号"] for i in self._upcoming), priority=1)
 
     def _find_row_by_sid_or_name(self):
         # 签到前确保暂停
@@ -473,10 +888,78 @@ class MainWindow(FluentWindow):
         if self.no_repeat and row in self.current_idx_pool:
             try: self.current_idx_pool.remove(row)
             except ValueError: pass
+            self._upcoming = deque(i for i in self._upcoming if i != row)
 
+        self._sync_local(self.df.at[row, "学号"], "sign", now)
         self._save_cache()
         self._toast("已签到", f"{self.df.at[row,'学号']} {self.df.at[row,'姓名']} ✓", "success")
 
+    # --------- 多人抽取/分组 ----------
+    def _set_group_view(self, on: bool):
+        self.groupView.setVisible(on)
+        self.bigText.setVisible(not on)
+        self.photoLabel.setVisible(not on and self.photos.count() > 0)
+
+    def _show_groups(self, groups):
+        self.last_groups = groups
+        self.last_show_text = ""     # 大屏不再对应单个学生，签到改用表格选中行
+        sid, name = self.df["学号"].to_numpy(), self.df["姓名"].to_numpy()
+        lines = [f"{title}（{len(rows)}人）：" + "、".join(f"{sid[r]} {name[r]}" for r in rows)
+                 for title, rows in groups]
+        self.groupView.setPlainText("\n".join(lines))
+        self._set_group_view(True)
+
+    def pick_many(self):
+        if self.df is None or self.df.empty:
+            self._toast("提示", "请先导入花名册。", "warning"); return
+        if self.rolling: self.toggle_roll()
+        if not self.current_idx_pool:
+            had_round = bool(self._picked)
+            self._rebuild_pool()
+            if had_round and not self._picked:
+                self._toast("新一轮", "没签到的同学都已抽过，重新开始一轮。", "info")
+        if not self.current_idx_pool:
+            self._toast("完成", "全部学生已签到。", "success"); return
+        k = min(self.pickSpin.value(), len(self.current_idx_pool))
+        rows = self.rng.choice(np.asarray(self.current_idx_pool), size=k, replace=False)
+        if self.no_repeat:
+            # 不重复模式下，多人抽中的人记入本轮已抽名单，重建抽取池时也不会回来，
+            # 直到换名单、清空所有签到，或没签到的人全部抽过一轮
+            picked = set(rows.tolist())
+            self._picked |= picked
+            self.current_idx_pool = [i for i in self.current_idx_pool if i not in picked]
+            self._upcoming = deque(i for i in self._upcoming if i not in picked)
+        self._show_groups([("抽中", rows)])
+        if k < self.pickSpin.value():
+            self._toast("人数不足", f"抽取池只剩 {k} 人，已全部抽出。", "warning")
+
+    def make_groups(self):
+        if self.df is None or self.df.empty:
+            self._toast("提示", "请先导入花名册。", "warning"); return
+        if self.rolling: self.toggle_roll()
+        # 有人签到时只给到场的人分组，否则全班分组
+        present = (self.df["签到状态"] == "已签到").to_numpy()
+        rows = np.flatnonzero(present) if present.any() else np.arange(len(self.df))
+        prev = None
+        if self.chkAvoidPrev.isChecked() and self._prev_group:
+            prev = self.df["学号"].map(self._prev_group).fillna(-1).to_numpy(dtype=int)[rows]
+        groups = split_groups(rows, self.groupSpin.value(), prev, self.rng)
+        self._prev_group = {self.df.at[r, "学号"]: g for g, members in enumerate(groups) for r in members}
+        self._show_groups([(f"第{g + 1}组", members) for g, members in enumerate(groups)])
+        self._toast("分组完成", f"{len(rows)} 人分为 {len(groups)} 组。", "success")
+
+    def export_groups(self):
+        if not self.last_groups:
+            self._toast("提示", "请先抽取多人或随机分组。", "warning"); return
+        path, _ = QFileDialog.getSaveFileName(self, "导出分组", "分组.xlsx", "Excel 文件 (*.xlsx)")
+        if not path: return
+        frames = [self.df.loc[rows, ["学号", "姓名"]].assign(组别=title) for title, rows in self.last_groups]
+        try:
+            pd.concat(frames)[["组别", "学号", "姓名"]].to_excel(path, index=False)
+        except Exception as e:
+            self._toast("导出失败", str(e), "error"); return
+        self._toast("导出成功", path, "success")
+
     # --------- 清除 ----------
     def clear_all_sign(self):
         if self.df is None or self.df.empty: return
@@ -487,6 +970,8 @@ class MainWindow(FluentWindow):
             for r in range(len(self.df)):
                 self.table.item(r, 2).setText("")
                 self.table.item(r, 3).setText("")
+            self._sync_local(ALL, "clear")
+            self._picked.clear()
             self._update_stats(); self._rebuild_pool(); self._save_cache()
             self._toast("已清空", "已清空所有签到状态。", "success")
 
@@ -500,17 +985,209 @@ class MainWindow(FluentWindow):
             self.model.set_cell(r, "签到时间", "")
             self.table.item(r, 2).setText("")
             self.table.item(r, 3).setText("")
+            self._sync_local(self.df.at[r, "学号"], "clear")
         self._update_stats(); self._rebuild_pool(); self._save_cache()
         self._toast("已清除", f"已清除 {len(rows)} 行的签到。", "success")
 
+    # --------- 多机同步 ----------
+    def _on_sync_mode(self, i):
+        mode = SYNC_MODES[i]
+        if mode == "folder":
+            folder = QFileDialog.getExistingDirectory(self, "选择共享文件夹", self.sync_folder)
+            if not folder:
+                # 取消时把下拉框改回去，屏蔽信号以免再触发一次重启同步
+                self.syncBox.blockSignals(True)
+                self.syncBox.setCurrentIndex(SYNC_MODES.index(self.sync_mode))
+                self.syncBox.blockSignals(False)
+                return
+            self.sync_folder = folder
+        self.sync_mode = mode
+        self._save_state()
+        self._restart_sync()
+        if self.sync_peer is not None:
+            self._toast("多机同步", f"已开启{SYNC_LABELS[i]}，同一份名单的签到会自动合并。", "success")
+
+    def _restart_sync(self):
+        """换名单或换同步方式时重连。同步会话是（名单, 当天日期），日志存在本地，
+        同步关闭时也照常记录本机的签到/清除，重连后由对方按 digest 补齐；往日的日志会被清理掉"""
+        self.sync_timer.stop()
+        if self.sync_peer is not None:
+            self.sync_peer.close()
+            self.sync_peer = None
+        if self.df is None or self.df.empty: return
+        session = datetime.now().strftime("%Y%m%d")
+        room = roster_room(self.df["学号"], session)
+        if room != self._sync_room:
+            os.makedirs(SYNC_LOG_DIR, exist_ok=True)
+            prune_logs(SYNC_LOG_DIR, session)
+            self.sync_log = SyncLog(self.sync_node, os.path.join(SYNC_LOG_DIR, f"{room}-{self.sync_node}.jsonl"))
+            self._sync_room = room
+        if self.sync_mode == "off": return
+        try:
+            self.sync_peer = make_peer(self.sync_mode, self.sync_log, room, self.sync_folder)
+        except OSError as e:
+            self._toast("同步失败", str(e), "error"); return
+        if self.sync_peer is None:
+            self._toast("同步失败", "共享文件夹不存在。", "error"); return
+        self._apply_sync([ALL])
+        self.sync_timer.start()
+
+    def _sync_local(self, sid, op, at=""):
+        # 不管是否连着对方都记进日志，这样离线时的签到/清除也带着真实时间戳参与合并
+        if self.sync_log is None: return
+        ev = self.sync_log.local(sid, op, at)
+        if self.sync_peer is not None: self.sync_peer.push(ev)
+
+    def _sync_poll(self):
+        changed = self.sync_peer.poll() if self.sync_peer is not None else []
+        if changed: self._apply_sync(changed)
+
+    def _apply_sync(self, changed):
+        """把日志里的合并结果写回表格；ALL 表示逐行核对"""
+        rows = range(len(self.df)) if ALL in changed else [self._row_of[s] for s in changed if s in self._row_of]
+        cleared = False
+        for r in rows:
+            ev = self.sync_log.state(self.df.at[r, "学号"])
+            if ev is None: continue          # 日志里没有记录的行保持本机状态
+            signed = ev["op"] == "sign"
+            status, at = ("已签到", ev["at"]) if signed else ("", "")
+            if self.df.at[r, "签到状态"] == status and self.df.at[r, "签到时间"] == at: continue
+            self.model.set_cell(r, "签到状态", status)
+            self.model.set_cell(r, "签到时间", at)
+            self.table.item(r, 2).setText(status)
+            self.table.item(r, 3).setText(at)
+            if signed and self.no_repeat and r in self.current_idx_pool:
+                self.current_idx_pool.remove(r)
+                self._upcoming = deque(i for i in self._upcoming if i != r)
+            cleared = cleared or not signed
+        if cleared: self._rebuild_pool()
+        self._update_stats()
+
+    # --------- 课表 ----------
+    def edit_timetable(self):
+        text = "\n".join(f"{WEEKDAYS[wd]} {hm}  {f}" for wd, hm, f in self.timetable)
+        dlg = TimetableDialog(text, self)
+        if not dlg.exec(): return
+        timetable, errors = parse_timetable(dlg.text())
+        if errors:
+            self._toast("课表未保存", errors[0], "error"); return
+        self.timetable = timetable
+        # 旧的预读结果全部作废（还在读的按版本号丢弃），改过的课次可以重新预读
+        self._tt_gen += 1
+        for slot in list(self._tt_jobs): self._drop_prepared(slot)
+        slots = {(hm, path) for _, hm, path in timetable}
+        self._tt_done = {k for k in self._tt_done if (k[1], k[2]) in slots}
+        self._tt_asked.clear()
+        self._save_state()
+        self._toast("课表", f"已保存 {len(self.timetable)} 节课。", "success")
+
+    def _tt_cache_path(self, gen, hm):
+        return f"roster_cache_next_{gen}_{hm.replace(':', '')}.xlsx"
+
+    def _pending_pick(self):
+        """大屏上还有没处理完的结果：正在滚动、显示着分组，或抽中的人还没签到"""
+        if self.rolling or not self.groupView.isHidden(): return True
+        parts = (self.last_show_text or "").split()
+        row = self._row_of.get(parts[0]) if parts else None
+        return row is not None and self.df.at[row, "签到状态"] != "已签到"
+
+    def _timetable_tick(self):
+        """上课前 TIMETABLE_LEAD 秒在后台预读名单；到点后大屏空闲就直接切换，否则先问老师"""
+        if self._tt_asking: return
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        for wd, hm, path in self.timetable:
+            if wd != now.weekday(): continue
+            slot = (today, hm, path)
+            if slot in self._tt_done: continue
+            left = (datetime.strptime(f"{today} {hm}", "%Y-%m-%d %H:%M") - now).total_seconds()
+            if 0 < left <= TIMETABLE_LEAD and slot not in self._tt_jobs:
+                if not os.path.exists(path):
+                    self._tt_done.add(slot)
+                    self._toast("课表", f"找不到 {hm} 的花名册：{path}", "warning"); continue
+                self._tt_jobs[slot] = None
+                job = _RosterJob(self, (self._tt_gen, slot), path, self._tt_cache_path(self._tt_gen, hm))
+                QThreadPool.globalInstance().start(job)
+            elif left <= 0 and self._tt_jobs.get(slot) is not None and not self.rolling:
+                if not self._pending_pick():
+                    self._switch_roster(slot)
+                elif time.monotonic() - self._tt_asked.get(slot, -TIMETABLE_ASK_AGAIN) >= TIMETABLE_ASK_AGAIN:
+                    self._ask_switch(slot)
+
+    def _ask_switch(self, slot):
+        self._tt_asking = True
+        m = MessageBox("下一节课", f"{slot[1]} 的名单已准备好，现在切换吗？\n（选“稍后”会在大屏空闲时自动切换）", self)
+        m.yesButton.setText("现在切换")
+        m.cancelButton.setText("稍后")
+        ok = m.exec()
+        self._tt_asking = False
+        if ok and slot in self._tt_jobs: self._switch_roster(slot)
+        else: self._tt_asked[slot] = time.monotonic()
+
+    def _on_roster_ready(self, key, prepared):
+        """预读完成：表格也趁离上课还有一段时间先建好（隐藏、按当前搜索词过滤好），到点只需换上"""
+        gen, slot = key
+        if gen != self._tt_gen or slot not in self._tt_jobs:
+            self._remove_file(self._tt_cache_path(gen, slot[1])); return
+        df, keys, pool = prepared
+        table = self._make_table(self.page_main)
+        table.hide()
+        self._fill_table(table, df)
+        hidden = ~self._search_mask(keys, self.searchBox.text())
+        for r in np.flatnonzero(hidden): table.setRowHidden(int(r), True)
+        self._tt_jobs[slot] = (df, keys, pool, table, hidden, self._tt_cache_path(gen, slot[1]))
+
+    def _on_roster_failed(self, key, msg):
+        gen, slot = key
+        if gen != self._tt_gen: return
+        self._tt_jobs.pop(slot, None)
+        self._tt_done.add(slot)
+        self._toast("预读失败", msg, "error")
+
+    def _drop_prepared(self, slot):
+        prepared = self._tt_jobs.pop(slot, None)
+        if prepared is not None:
+            prepared[3].deleteLater()
+            self._remove_file(prepared[5])
+
+    @staticmethod
+    def _remove_file(path):
+        try: os.remove(path)
+        except OSError: pass
+
+    def _switch_roster(self, slot):
+        df, keys, pool, table, hidden, cache_path = self._tt_jobs.pop(slot)
+        self._tt_done.add(slot)
+        self._use_df(df, keys, table, hidden)
+        # 抽取池在同步记录合并进来之后再过滤，当天已签到的人不会再被抽到
+        if self.no_repeat:
+            signed = (self.df["签到状态"] == "已签到").to_numpy()
+            pool = [i for i in pool if not signed[i]]
+        self.current_idx_pool = pool
+        self._upcoming.clear()
+        self._set_group_view(False)
+        self.bigText.setText("——")
+        self.last_show_text = ""
+        self.photoLabel.clear()
+        self._shown_sid = None
+        try: os.replace(cache_path, CACHE_FILE)
+        except OSError: pass
+        self._toast("已切换", f"{slot[1]} 上课：已载入 {len(df)} 名学生。", "success")
+
     # --------- 其它 ----------
-    def _on_search(self, kw: str):
+    @staticmethod
+    def _search_mask(keys, kw):
         kw = kw.strip()
-        for r in range(self.table.rowCount()):
-            sid = self.table.item(r, 0).text()
-            name = self.table.item(r, 1).text()
-            show = (kw in sid) or (kw in name) or (kw == "")
-            self.table.setRowHidden(r, not show)
+        if kw: return keys.str.contains(kw, regex=False).to_numpy(dtype=bool)
+        return np.ones(len(keys), dtype=bool)
+
+    def _on_search(self, kw: str, refresh_all=False):
+        show = self._search_mask(self._search_keys, kw)
+        # 输入时只改变化了的行，大名单上也不卡；换名单后表格行状态未知，逐行设一遍
+        rows = range(len(show)) if refresh_all else np.flatnonzero(show == self._hidden)
+        for r in rows:
+            self.table.setRowHidden(int(r), not show[r])
+        self._hidden = ~show
 
     def _update_stats(self):
         if self.df is None or self.df.empty:
@@ -9,6 +9,7 @@
 # -*- coding: utf-8 -*-
 
 import sys, os, random
+import numpy as np
 import pandas as pd
 
 from PySide6.QtCore import Qt, QTimer
@@ -20,7 +21,7 @@ from PySide6.QtWidgets import (
 # 这些控件来自 qfluentwidgets，用在普通 QWidget/QMainWindow 上也没问题
 from qfluentwidgets import (
     setTheme, Theme, setFont,
-    FluentIcon as FI, PrimaryPushButton, StrongBodyLabel
+    FluentIcon as FI, PrimaryPushButton, PushButton, StrongBodyLabel, SpinBox
 )
 
 CACHE_FILE = "roster_cache.xlsx"
@@ -46,6 +47,22 @@ def resolve_columns(df: pd.DataFrame):
     return cols_map
 
 
+def split_groups(idx, n_groups, prev=None, rng=None):
+    """与 name_picker.py 相同：一次随机打乱后均分成 n_groups 组，prev 为上次组号（-1 表示没有）"""
+    rng = rng or np.random.default_rng()
+    idx = np.asarray(idx)
+    if len(idx) == 0:
+        return []
+    n_groups = max(1, min(n_groups, len(idx)))
+    order = rng.permutation(len(idx))
+    if prev is not None:
+        prev = np.asarray(prev, dtype=int)
+        rank = rng.permutation(prev.max() + 2)[prev + 1]
+        order = order[np.argsort(rank[order], kind="stable")]
+    labels = (np.arange(len(idx)) + rng.integers(n_groups)) % n_groups
+    return [idx[order[labels == g]] for g in range(n_groups)]
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -57,6 +74,8 @@ class MainWindow(QMainWindow):
         self.rolling = False
         self.last_show_text = ""
         self.current_idx_pool = []
+        self.prev_group = None      # 上次分组的组号，下次分组时尽量打散
+        self.rng = np.random.default_rng()
 
         # 定时器：固定滚动速度 50ms
         self.roll_timer = QTimer(self)
@@ -71,17 +90,27 @@ class MainWindow(QMainWindow):
         page.setObjectName("mainPage")
         page.setMinimumSize(600, 400)
 
-        # 顶部按钮（仅 导入 / 开始-暂停）
+        # 顶部按钮（导入 / 开始-暂停 / 抽多人 / 分组）
         self.btnImport = PrimaryPushButton(FI.FOLDER, "导入Excel", page)
         self.btnToggle = PrimaryPushButton(FI.PLAY, "开始", page)
+        self.countSpin = SpinBox(page)
+        self.countSpin.setRange(2, 50)
+        self.countSpin.setValue(4)
+        self.btnPickMany = PushButton(FI.PEOPLE, "抽N人", page)
+        self.btnGroup = PushButton(FI.TILES, "分N组", page)
         self.btnImport.clicked.connect(self.load_excel)
         self.btnToggle.clicked.connect(self.toggle_roll)
+        self.btnPickMany.clicked.connect(self.pick_many)
+        self.btnGroup.clicked.connect(self.make_groups)
 
         topBar = QHBoxLayout()
         topBar.setSpacing(8)
         topBar.addWidget(self.btnImport)
         topBar.addWidget(self.btnToggle)
         topBar.addStretch(1)
+        topBar.addWidget(self.countSpin)
+        topBar.addWidget(self.btnPickMany)
+        topBar.addWidget(self.btnGroup)
 
         # 大屏显示结果
         self.bigText = StrongBodyLabel("——", page)
@@ -92,6 +121,7 @@ class MainWindow(QMainWindow):
         bigLay = QVBoxLayout(bigFrame)
         self.bigText.setStyleSheet("QLabel{font-size:56px; font-weight:800;}")
         self.bigText.setMinimumHeight(160)
+        self.bigText.setWordWrap(True)
         bigLay.addWidget(self.bigText)
 
         # 布局
@@ -154,6 +184,7 @@ class MainWindow(QMainWindow):
     def _use_df(self, df: pd.DataFrame):
         self.df = df
         self.current_idx_pool = list(range(len(self.df)))
+        self.prev_group = None
 
     # ---------- 抽取 ----------
     def toggle_roll(self):
@@ -162,6 +193,7 @@ class MainWindow(QMainWindow):
         if not self.rolling:
             if not self.current_idx_pool:
                 self.current_idx_pool = list(range(len(self.df)))
+            self._set_big_font(56)
             self.rolling = True
             self.roll_timer.start()
             self.btnToggle.setText("暂停")
@@ -181,6 +213,36 @@ class MainWindow(QMainWindow):
         self.last_show_text = f"{sid}  {name}"
         self.bigText.setText(self.last_show_text)
 
+    # ---------- 多人 / 分组 ----------
+    def _set_big_font(self, px):
+        self.bigText.setStyleSheet(f"QLabel{{font-size:{px}px; font-weight:800;}}")
+
+    def _show_lines(self, lines):
+        if self.rolling:
+            self.toggle_roll()
+        # 行数越多字越小，保证都能放进大屏
+        self._set_big_font(max(16, 56 // max(1, len(lines))))
+        self.last_show_text = "\n".join(lines)
+        self.bigText.setText(self.last_show_text)
+
+    def pick_many(self):
+        if self.df is None or self.df.empty:
+            return
+        k = min(self.countSpin.value(), len(self.df))
+        rows = self.rng.choice(len(self.df), size=k, replace=False)
+        self._show_lines(["  ".join(self.df["姓名"].to_numpy()[rows])])
+
+    def make_groups(self):
+        if self.df is None or self.df.empty:
+            return
+        rows = np.arange(len(self.df))
+        groups = split_groups(rows, self.countSpin.value(), self.prev_group, self.rng)
+        self.prev_group = np.empty(len(self.df), dtype=int)
+        for g, members in enumerate(groups):
+            self.prev_group[members] = g
+        names = self.df["姓名"].to_numpy()
+        self._show_lines([f"第{g + 1}组：" + "、".join(names[m]) for g, m in enumerate(groups)])
+
 
 def main():
     app = QApplication(sys.argv)
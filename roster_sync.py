@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# @File     : roster_sync.py
+# @Verison  : V1.0
+# @Desctrion: 多台电脑同时签到时的增量同步（只依赖标准库，可脱离界面单独运行）
+#
+# 每次签到/清除都记成一条带时间戳的事件，同一学号以“时间戳最新者为准”合并（LWW），
+# 合并与顺序、重复无关，所以各机器收到的事件集合一样时结果一定一样。
+# 只在网络上/共享目录里交换新增事件，不传整张花名册。
+# 同步范围是“会话”：名单指纹 + 会话号（界面里用当天日期），往日的记录不会再被合并进来。
+# 本机的事件日志按会话保存在本地，节点号固定，重启后时间戳和序号都接着用；
+# 同一目录里同时开两个程序时，后开的那个会换一个节点号（见 claim_node）。
+#
+# 会话号里不要带“-”。
+#
+# 两个进程自测（两个终端分别运行，几秒后两边打印的已签到名单应一致）：
+#   python roster_sync.py lan 1001 1002 --session=t1
+#   python roster_sync.py lan 1003 --session=t1
+# 共享目录：
+#   python roster_sync.py folder:/path/to/shared 1001 --session=t2
+
+import sys, os, json, time, uuid, socket, hashlib
+
+SYNC_PORT = 45454
+SYNC_ADDR = "255.255.255.255"
+DIGEST_INTERVAL = 1.0       # 秒；定期广播“我已收到哪些事件”，对方据此补发丢失的事件
+MAX_EVENTS_PER_PACKET = 40  # 控制单个 UDP 包大小
+ALL = "*"                   # “清空所有签到”对应的学号
+
+
+_node_locks = []            # 持有到进程退出，退出时系统自动释放文件锁
+
+
+def new_node_id():
+    return uuid.uuid4().hex[:8]
+
+
+def claim_node(folder, preferred=None):
+    """给本进程挑一个没被占用的节点号：优先用 preferred，已被同目录的另一个进程占用时换新的。
+    占用靠对 <folder>/<节点号>.lock 加文件锁实现"""
+    os.makedirs(folder, exist_ok=True)
+    for node in [preferred or new_node_id()] + [new_node_id() for _ in range(3)]:
+        f = open(os.path.join(folder, node + ".lock"), "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _node_locks.append(f)
+        return node
+    return new_node_id()
+
+
+def roster_room(sids, session=""):
+    """会话标识：花名册指纹 + 会话号，只有同一会话的机器才互相同步"""
+    h = hashlib.sha1("\n".join(sorted(str(s) for s in sids)).encode("utf-8")).hexdigest()[:12]
+    return f"{h}-{session}" if session else h
+
+
+def prune_logs(folder, session, node=None):
+    """删掉 folder 里其它会话的日志（<指纹>-<会话号>[-<节点>].jsonl）；
+    给了 node 时只删本机自己的（共享目录里别人的文件不动）"""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    for fn in names:
+        if not fn.endswith(".jsonl"): continue
+        parts = fn[:-len(".jsonl")].split("-")
+        if len(parts) < 2 or parts[1] == session: continue
+        if node is not None and parts[-1] != node: continue
+        try: os.remove(os.path.join(folder, fn))
+        except OSError: pass
+
+
+def _read_lines(path, pos=0):
+    """从 pos 起读完整的 JSON 行，返回 (事件列表, 新偏移)；写了一半的行留到下次"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(pos)
+            data = f.read()
+    except OSError:
+        return [], pos
+    end = data.rfind(b"\n") + 1
+    out = []
+    for line in data[:end].splitlines():
+        try: out.append(json.loads(line.decode("utf-8")))
+        except ValueError: pass
+    return out, pos + end
+
+
+class SyncLog:
+    """签到事件日志 + 按学号的 LWW 合并结果。给了 path 时从文件恢复，并把新事件追加写回"""
+    def __init__(self, node=None, path=None):
+        self.node = node or new_node_id()
+        self.path = path
+        self.seq = 0
+        self.clock = 0                # 混合逻辑时钟（毫秒），保证看到过的事件之后再发生的事件时间戳一定更大
+        self.events = {}              # node -> {seq: event}
+        self.head = {}                # node -> 连续收到的最大 seq
+        self.reg = {}                 # 学号 -> 当前生效的事件
+        if path and os.path.exists(path):
+            self._merge(_read_lines(path)[0])
+            self.seq = max(self.events.get(self.node, {0: None}))
+
+    def local(self, sid, op, at="", ts=None):
+        """记录本机的一次签到（op="sign"）或清除（op="clear"），返回事件。
+        ts 为事件实际发生的时间（毫秒），默认取当前时间"""
+        self.seq += 1
+        if ts is None:
+            ts = self.clock = max(self.clock + 1, int(time.time() * 1000))
+        ev = {"node": self.node, "seq": self.seq, "ts": ts, "sid": str(sid), "op": op, "at": at}
+        self.merge([ev])
+        return ev
+
+    def merge(self, events):
+        """合并事件（本机或远端），返回状态发生变化的学号列表；ALL 表示全部清空"""
+        changed, new = self._merge(events)
+        if new and self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in new)
+            except OSError:
+                pass
+        return changed
+
+    def own_events(self, after=0):
+        return [ev for s, ev in sorted(self.events.get(self.node, {}).items()) if s > after]
+
+    def _merge(self, events):
+        changed, new = [], []
+        for ev in events:
+            got = self.events.setdefault(ev["node"], {})
+            if ev["seq"] in got: continue
+            got[ev["seq"]] = ev
+            new.append(ev)
+            h = self.head.get(ev["node"], 0)
+            while h + 1 in got: h += 1
+            self.head[ev["node"]] = h
+            self.clock = max(self.clock, ev["ts"])
+            cur = self.reg.get(ev["sid"])
+            if cur is None or self._key(ev) > self._key(cur):
+                self.reg[ev["sid"]] = ev
+                changed.append(ev["sid"])
+        return changed, new
+
+    def state(self, sid):
+        """学号当前生效的事件（已考虑“清空所有”），没有记录时返回 None"""
+        ev, wipe = self.reg.get(str(sid)), self.reg.get(ALL)
+        if wipe is not None and (ev is None or self._key(wipe) > self._key(ev)):
+            return wipe
+        return ev
+
+    def digest(self):
+        return dict(self.head)
+
+    def missing_for(self, digest):
+        """对方 digest 之后、本机已有的事件"""
+        out = []
+        for node, got in self.events.items():
+            h = digest.get(node, 0)
+            out.extend(ev for s, ev in got.items() if s > h)
+        return out
+
+    @staticmethod
+    def _key(ev):
+        return ev["ts"], ev["node"], ev["seq"]
+
+
+class LanPeer:
+    """局域网 UDP 广播：新事件立即广播，定期广播 digest，收到落后的 digest 时补发"""
+    def __init__(self, log, room, port=SYNC_PORT, addr=SYNC_ADDR):
+        self.log, self.room, self.addr = log, room, (addr, port)
+        self._outbox = []
+        self._last_digest = 0.0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.bind(("", port))
+        self.sock.setblocking(False)
+
+    def push(self, ev):
+        self._outbox.append(ev)
+
+    def poll(self):
+        """非阻塞：收发一轮，返回状态变化的学号"""
+        changed = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            try:
+                msg = json.loads(data.decode("utf-8"))
+            except ValueError:
+                continue
+            if msg.get("room") != self.room or msg.get("node") == self.log.node: continue
+            if "events" in msg:
+                changed += self.log.merge(msg["events"])
+            if "digest" in msg:
+                self._outbox += self.log.missing_for(msg["digest"])
+
+        if self._outbox:
+            self._send_events(self._outbox)
+            self._outbox = []
+        now = time.monotonic()
+        if now - self._last_digest >= DIGEST_INTERVAL:
+            self._last_digest = now
+            self._send({"digest": self.log.digest()})
+        return changed
+
+    def close(self):
+        self.sock.close()
+
+    def _send_events(self, events):
+        uniq = {(e["node"], e["seq"]): e for e in events}
+        events = list(uniq.values())
+        for i in range(0, len(events), MAX_EVENTS_PER_PACKET):
+            self._send({"events": events[i:i + MAX_EVENTS_PER_PACKET]})
+
+    def _send(self, payload):
+        payload.update(room=self.room, node=self.log.node)
+        try:
+            self.sock.sendto(json.dumps(payload, ensure_ascii=False).encode("utf-8"), self.addr)
+        except OSError:
+            pass
+
+
+class FolderPeer:
+    """共享目录：每台机器只追加写自己的 <room>-<node>.jsonl，按偏移量增量读取别人的文件"""
+    def __init__(self, log, room, folder):
+        self.log, self.room, self.folder = log, room, folder
+        self._offsets = {}
+        self._own = os.path.join(folder, f"{room}-{log.node}.jsonl")
+        if "-" in room: prune_logs(folder, room.split("-", 1)[1], log.node)
+        # 本机文件里还没写过的事件（同步关闭期间或上次没来得及写的）补写进去
+        written = [ev["seq"] for ev in _read_lines(self._own)[0]]
+        self._outbox = self.log.own_events(max(written, default=0))
+
+    def push(self, ev):
+        self._outbox.append(ev)
+
+    def poll(self):
+        changed = []
+        if self._outbox:
+            try:
+                with open(self._own, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in self._outbox)
+                self._outbox = []
+            except OSError:
+                pass
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return changed
+        for fn in names:
+            path = os.path.join(self.folder, fn)
+            if not fn.startswith(self.room + "-") or not fn.endswith(".jsonl") or path == self._own: continue
+            events, self._offsets[path] = _read_lines(path, self._offsets.get(path, 0))
+            changed += self.log.merge(events)
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_peer(mode, log, room, folder=""):
+    """mode: "lan" / "folder"；其它值返回 None（不同步）"""
+    if mode == "lan": return LanPeer(log, room)
+    if mode == "folder" and folder and os.path.isdir(folder): return FolderPeer(log, room, folder)
+    return None
+
+
+def _demo(argv):
+    session = time.strftime("%Y%m%d")
+    for a in [a for a in argv if a.startswith("--session=")]:
+        session = a.split("=", 1)[1]
+        argv.remove(a)
+    mode = argv[0] if argv else "lan"
+    folder = ""
+    if mode.startswith("folder:"): mode, folder = "folder", mode[len("folder:"):]
+    room = roster_room((str(1000 + i) for i in range(50)), session)
+    log = SyncLog()
+    peer = make_peer(mode, log, room, folder)
+    if peer is None:
+        print("用法：python roster_sync.py lan|folder:<目录> [学号 ...] [--session=会话号]"); return
+    for sid in argv[1:]:
+        peer.push(log.local(sid, "sign", time.strftime("%Y-%m-%d %H:%M:%S")))
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        peer.poll()
+        time.sleep(0.05)
+    signed = sorted(s for s in log.reg if s != ALL and log.state(s)["op"] == "sign")
+    print(log.node, "已签到:", " ".join(signed))
+    peer.close()
+
+
+if __name__ == "__main__":
+    _demo(sys.argv[1:])